@@ -43,6 +43,8 @@ class OrdenAdmin(admin.ModelAdmin):
     readonly_fields = ('codigo_orden', 'fecha_creacion')
     inlines = [ItemOrdenInline]
     date_hierarchy = 'fecha_creacion'
+    list_select_related = ('usuario',)
+    autocomplete_fields = ['usuario']
 
 # --- NUEVO ---
 # Se necesita registrar ItemOrdenAdmin para que autocomplete_fields funcione en SeguimientoProduccionAdmin
@@ -63,6 +65,7 @@ class ProcesoAdmin(admin.ModelAdmin):
     list_display = ('nombre', 'etapa', 'orden_secuencia')
     list_filter = ('etapa',)
     ordering = ('etapa__orden_secuencia', 'orden_secuencia')
+    list_select_related = ('etapa',)
 
 @admin.register(Subproceso)
 class SubprocesoAdmin(admin.ModelAdmin):
@@ -72,24 +75,53 @@ class SubprocesoAdmin(admin.ModelAdmin):
     # Se añade search_fields para que autocomplete_fields funcione
     search_fields = ('nombre', 'proceso__nombre') 
     ordering = ('proceso__etapa__orden_secuencia', 'proceso__orden_secuencia', 'orden_secuencia')
+    list_select_related = ('proceso__etapa',)
+
+class SubprocesoEnUsoFilter(admin.SimpleListFilter):
+    """Filtro por subproceso que solo lista los subprocesos con seguimientos.
+
+    El filtro por FK estándar renderiza todos los Subprocesos en el sidebar
+    (una consulta a la tabla completa en cada carga del admin).
+    """
+    title = 'subproceso actual'
+    parameter_name = 'subproceso_actual'
+
+    def lookups(self, request, model_admin):
+        return (
+            SeguimientoProduccion.objects
+            .values_list('subproceso_actual_id', 'subproceso_actual__nombre')
+            .order_by('subproceso_actual__nombre')
+            .distinct()
+        )
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(subproceso_actual_id=self.value())
+        return queryset
+
 
 @admin.register(SeguimientoProduccion)
 class SeguimientoProduccionAdmin(admin.ModelAdmin):
     list_display = ('item_orden', 'subproceso_actual', 'estado', 'fecha_inicio', 'fecha_fin')
-    list_filter = ('estado', 'subproceso_actual')
+    list_filter = ('estado', SubprocesoEnUsoFilter)
     search_fields = ('item_orden__producto__nombre', 'subproceso_actual__nombre')
     readonly_fields = ('fecha_inicio', 'fecha_fin', 'duracion_total_segundos')
     filter_horizontal = ('trabajadores_asignados',)
     autocomplete_fields = ['item_orden', 'subproceso_actual']
+    list_select_related = ('item_orden__producto', 'subproceso_actual')
 
 @admin.register(RegistroAsistencia)
 class RegistroAsistenciaAdmin(admin.ModelAdmin):
     list_display = ('seguimiento', 'trabajador', 'fecha', 'asistio')
     list_filter = ('asistio', 'fecha')
     date_hierarchy = 'fecha'
+    list_select_related = ('seguimiento__item_orden__producto', 'seguimiento__subproceso_actual', 'trabajador')
+    autocomplete_fields = ['seguimiento', 'trabajador']
 
 @admin.register(RegistroActividad)
 class RegistroActividadAdmin(admin.ModelAdmin):
     list_display = ('seguimiento', 'tipo_evento', 'timestamp', 'usuario')
     list_filter = ('tipo_evento',)
-    readonly_fields = ('timestamp',)
\ No newline at end of file
+    readonly_fields = ('timestamp',)
+    list_select_related = ('seguimiento__item_orden__producto', 'seguimiento__subproceso_actual', 'usuario')
+    autocomplete_fields = ['seguimiento', 'usuario']
\ No newline at end of file
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.17 on 2026-08-29 15:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='registroactividad',
+            index=models.Index(fields=['seguimiento', '-timestamp'], name='reg_act_seg_ts_idx'),
+        ),
+    ]
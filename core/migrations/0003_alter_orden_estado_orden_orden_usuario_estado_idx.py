@@ -0,0 +1,24 @@
+# Generated by Django 5.2.17 on 2026-08-29 15:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_registroactividad_reg_act_seg_ts_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='orden',
+            name='estado',
+            field=models.CharField(choices=[('CARRITO', 'Carrito'), ('PROCESADA', 'Procesada'), ('EN_PRODUCCION', 'En Producción'), ('COMPLETADA', 'Completada')], db_index=True, default='CARRITO', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='orden',
+            index=models.Index(fields=['usuario', 'estado'], name='orden_usuario_estado_idx'),
+        ),
+    ]
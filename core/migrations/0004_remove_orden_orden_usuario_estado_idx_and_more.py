@@ -0,0 +1,39 @@
+# Generated by Django 5.2.17 on 2026-08-29 15:10
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_alter_orden_estado_orden_orden_usuario_estado_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='orden',
+            name='orden_usuario_estado_idx',
+        ),
+        migrations.AlterField(
+            model_name='orden',
+            name='lote_asignado',
+            field=models.CharField(blank=True, db_index=True, help_text='Código de lote para la producción', max_length=50, null=True),
+        ),
+        migrations.AlterField(
+            model_name='registroactividad',
+            name='tipo_evento',
+            field=models.CharField(choices=[('INICIO', 'Inicio'), ('PAUSA', 'Pausa'), ('REANUDAR', 'Reanudar'), ('FIN', 'Fin')], db_index=True, max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='registroasistencia',
+            name='fecha',
+            field=models.DateField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='orden',
+            index=models.Index(fields=['usuario', 'estado', '-fecha_creacion'], name='orden_usuario_estado_idx'),
+        ),
+    ]
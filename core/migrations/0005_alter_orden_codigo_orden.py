@@ -0,0 +1,19 @@
+# Generated by Django 5.2.17 on 2026-08-29 15:13
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_remove_orden_orden_usuario_estado_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='orden',
+            name='codigo_orden',
+            field=models.CharField(default=core.models.generar_codigo_orden, editable=False, max_length=20, unique=True),
+        ),
+    ]
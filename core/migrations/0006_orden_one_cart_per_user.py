@@ -0,0 +1,19 @@
+# Generated by Django 5.2.17 on 2026-08-29 15:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_alter_orden_codigo_orden'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='orden',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado', 'CARRITO')), fields=('usuario',), name='one_cart_per_user'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.17 on 2026-08-29 15:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_orden_one_cart_per_user'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='registroasistencia',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='registroasistencia',
+            constraint=models.UniqueConstraint(fields=('seguimiento', 'trabajador', 'fecha'), name='uniq_asistencia_day'),
+        ),
+    ]
@@ -48,6 +48,10 @@ class Producto(models.Model):
 
 # --- Modelos para Pedidos y Carrito ---
 
+def generar_codigo_orden():
+    """Genera un código único para una orden nueva."""
+    return f"ORD-{uuid.uuid4().hex[:8].upper()}"
+
 class Orden(models.Model):
     """Representa un pedido, que inicia como un carrito de compras."""
     class EstadoOrden(models.TextChoices):
@@ -56,17 +60,27 @@ class Orden(models.Model):
         EN_PRODUCCION = 'EN_PRODUCCION', 'En Producción'
         COMPLETADA = 'COMPLETADA', 'Completada'
 
-    codigo_orden = models.CharField(max_length=20, unique=True, editable=False)
+    codigo_orden = models.CharField(max_length=20, unique=True, editable=False, default=generar_codigo_orden)
     usuario = models.ForeignKey(User, on_delete=models.CASCADE, help_text="Usuario que realiza el pedido")
-    estado = models.CharField(max_length=20, choices=EstadoOrden.choices, default=EstadoOrden.CARRITO)
+    estado = models.CharField(max_length=20, choices=EstadoOrden.choices, default=EstadoOrden.CARRITO, db_index=True)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
-    lote_asignado = models.CharField(max_length=50, blank=True, null=True, help_text="Código de lote para la producción")
+    lote_asignado = models.CharField(max_length=50, blank=True, null=True, db_index=True, help_text="Código de lote para la producción")
 
-    def save(self, *args, **kwargs):
-        if not self.codigo_orden:
-            # Genera un código único para la orden
-            self.codigo_orden = f"ORD-{uuid.uuid4().hex[:8].upper()}"
-        super().save(*args, **kwargs)
+    class Meta:
+        indexes = [
+            # Cubre tanto la búsqueda del carrito (usuario, estado) como el
+            # listado de órdenes del usuario ordenado por fecha
+            models.Index(fields=['usuario', 'estado', '-fecha_creacion'], name='orden_usuario_estado_idx'),
+        ]
+        constraints = [
+            # Un usuario solo puede tener un carrito abierto a la vez; las
+            # creaciones concurrentes colapsan en un IntegrityError manejable
+            models.UniqueConstraint(
+                fields=['usuario'],
+                condition=models.Q(estado='CARRITO'),
+                name='one_cart_per_user',
+            ),
+        ]
 
     def __str__(self):
         return f"Orden {self.codigo_orden} - {self.estado}"
@@ -143,11 +157,18 @@ class RegistroAsistencia(models.Model):
     """Registra la asistencia diaria de un trabajador a un subproceso."""
     seguimiento = models.ForeignKey(SeguimientoProduccion, on_delete=models.CASCADE)
     trabajador = models.ForeignKey(Trabajador, on_delete=models.CASCADE)
-    fecha = models.DateField(default=timezone.now)
+    fecha = models.DateField(default=timezone.now, db_index=True)
     asistio = models.BooleanField(default=True)
 
     class Meta:
-        unique_together = ('seguimiento', 'trabajador', 'fecha')
+        constraints = [
+            # Un registro de asistencia por trabajador, seguimiento y día;
+            # respalda el upsert bulk_create(update_conflicts=True)
+            models.UniqueConstraint(
+                fields=['seguimiento', 'trabajador', 'fecha'],
+                name='uniq_asistencia_day',
+            ),
+        ]
 
     def __str__(self):
         estado = "Asistió" if self.asistio else "Faltó"
@@ -162,9 +183,15 @@ class RegistroActividad(models.Model):
         FIN = 'FIN', 'Fin'
 
     seguimiento = models.ForeignKey(SeguimientoProduccion, on_delete=models.CASCADE, related_name="actividades")
-    tipo_evento = models.CharField(max_length=20, choices=TipoEvento.choices)
+    tipo_evento = models.CharField(max_length=20, choices=TipoEvento.choices, db_index=True)
     timestamp = models.DateTimeField(auto_now_add=True)
     usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Acelera la búsqueda del último evento de un seguimiento en el cronómetro
+            models.Index(fields=['seguimiento', '-timestamp'], name='reg_act_seg_ts_idx'),
+        ]
+
     def __str__(self):
         return f"Evento {self.tipo_evento} en {self.seguimiento} a las {self.timestamp}"
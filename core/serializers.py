@@ -1,4 +1,7 @@
+import functools
+
 from rest_framework import serializers
+from drf_spectacular.utils import extend_schema_field
 from .models import (
     EmpresaTercera, Trabajador, LineaProducto, Producto, Orden, ItemOrden,
     Etapa, Proceso, Subproceso, SeguimientoProduccion, RegistroAsistencia, RegistroActividad
@@ -11,6 +14,19 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = ('id', 'username', 'first_name', 'last_name', 'email')
 
+@functools.lru_cache(maxsize=1024)
+def _payload_usuario(user_id, username, first_name, last_name, email):
+    """Dict serializado de un usuario, memoizado por sus valores.
+
+    Al listar órdenes muchas filas comparten usuario; la clave incluye todos
+    los campos expuestos, así un cambio en el usuario genera una entrada nueva
+    sin necesidad de invalidación explícita.
+    """
+    return {
+        'id': user_id, 'username': username, 'first_name': first_name,
+        'last_name': last_name, 'email': email,
+    }
+
 # --- Serializadores para Trabajadores ---
 class EmpresaTerceraSerializer(serializers.ModelSerializer):
     class Meta:
@@ -50,7 +66,7 @@ class ItemOrdenSerializer(serializers.ModelSerializer):
 
 class OrdenSerializer(serializers.ModelSerializer):
     items = ItemOrdenSerializer(many=True, read_only=True)
-    usuario = UserSerializer(read_only=True)
+    usuario = serializers.SerializerMethodField()
     total_items = serializers.SerializerMethodField()
 
     class Meta:
@@ -58,8 +74,19 @@ class OrdenSerializer(serializers.ModelSerializer):
         fields = ('id', 'codigo_orden', 'usuario', 'estado', 'fecha_creacion', 'lote_asignado', 'items', 'total_items')
         read_only_fields = ('codigo_orden', 'usuario', 'fecha_creacion')
 
+    @extend_schema_field(UserSerializer)
+    def get_usuario(self, obj):
+        usuario = obj.usuario
+        return _payload_usuario(
+            usuario.id, usuario.username, usuario.first_name,
+            usuario.last_name, usuario.email,
+        )
+
     def get_total_items(self, obj):
-        return obj.items.count()
+        # Usa la anotación del queryset si está disponible; el count() queda
+        # como respaldo para instancias no anotadas (ej: el carrito).
+        total = getattr(obj, 'total_items', None)
+        return total if total is not None else obj.items.count()
 
 # --- Serializadores para Flujo de Producción ---
 class SubprocesoSerializer(serializers.ModelSerializer):
@@ -68,14 +95,15 @@ class SubprocesoSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 class ProcesoSerializer(serializers.ModelSerializer):
-    subprocesos = SubprocesoSerializer(many=True, read_only=True)
-    
+    # source apunta a la lista del Prefetch(to_attr=...) del viewset del flujo
+    subprocesos = SubprocesoSerializer(many=True, read_only=True, source='subprocesos_list')
+
     class Meta:
         model = Proceso
         fields = ('id', 'nombre', 'orden_secuencia', 'subprocesos')
 
 class EtapaSerializer(serializers.ModelSerializer):
-    procesos = ProcesoSerializer(many=True, read_only=True)
+    procesos = ProcesoSerializer(many=True, read_only=True, source='procesos_list')
 
     class Meta:
         model = Etapa
@@ -94,6 +122,19 @@ class RegistroActividadSerializer(serializers.ModelSerializer):
         model = RegistroActividad
         fields = '__all__'
 
+class SeguimientoProduccionListSerializer(serializers.ModelSerializer):
+    """Versión plana para el listado: solo ids y nombres, sin anidamiento."""
+    producto_nombre = serializers.CharField(source='item_orden.producto.nombre', read_only=True)
+    subproceso_nombre = serializers.CharField(source='subproceso_actual.nombre', read_only=True)
+
+    class Meta:
+        model = SeguimientoProduccion
+        fields = (
+            'id', 'item_orden', 'producto_nombre', 'subproceso_actual',
+            'subproceso_nombre', 'estado', 'fecha_inicio', 'fecha_fin',
+            'duracion_total_segundos'
+        )
+
 class SeguimientoProduccionSerializer(serializers.ModelSerializer):
     item_orden = ItemOrdenSerializer(read_only=True)
     subproceso_actual = SubprocesoSerializer(read_only=True)
@@ -0,0 +1,35 @@
+# core/signals.py
+
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Etapa, Proceso, Subproceso
+
+# El catálogo de flujo de producción cambia muy poco pero se consulta en cada
+# carga del cliente. La respuesta serializada se cachea bajo una clave
+# versionada; al guardar o borrar cualquier parte del árbol se incrementa la
+# versión, invalidando la entrada anterior sin necesidad de borrarla.
+
+FLUJO_CACHE_VERSION_KEY = 'flujo_produccion_version'
+FLUJO_CACHE_TIMEOUT = 60 * 60  # 1 hora
+
+
+def flujo_cache_key():
+    """Clave de cache actual para el árbol de flujo de producción."""
+    version = cache.get_or_set(FLUJO_CACHE_VERSION_KEY, 1, timeout=None)
+    return f'flujo_produccion_v{version}'
+
+
+@receiver(post_save, sender=Etapa)
+@receiver(post_save, sender=Proceso)
+@receiver(post_save, sender=Subproceso)
+@receiver(post_delete, sender=Etapa)
+@receiver(post_delete, sender=Proceso)
+@receiver(post_delete, sender=Subproceso)
+def invalidar_cache_flujo(sender, **kwargs):
+    """Invalida el cache del flujo al modificar el catálogo."""
+    try:
+        cache.incr(FLUJO_CACHE_VERSION_KEY)
+    except ValueError:
+        cache.set(FLUJO_CACHE_VERSION_KEY, 1, timeout=None)
@@ -3,11 +3,15 @@
 from rest_framework import viewsets, status, generics, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Prefetch, Sum
 from django.shortcuts import get_object_or_404
 from rest_framework.filters import SearchFilter, OrderingFilter
 from django_filters.rest_framework import DjangoFilterBackend
-from datetime import datetime, timezone
+from django.utils import timezone
 
 # --- Importaciones para drf-spectacular ---
 from drf_spectacular.utils import extend_schema
@@ -16,11 +20,48 @@ from .models import (
     EmpresaTercera, Trabajador, LineaProducto, Producto, Orden, ItemOrden,
     Etapa, Proceso, Subproceso, SeguimientoProduccion, RegistroAsistencia, RegistroActividad
 )
+from .signals import flujo_cache_key, FLUJO_CACHE_TIMEOUT
 from .serializers import (
     EmpresaTerceraSerializer, TrabajadorSerializer, LineaProductoSerializer, ProductoSerializer,
-    OrdenSerializer, ItemOrdenSerializer, EtapaSerializer, SeguimientoProduccionSerializer
+    OrdenSerializer, ItemOrdenSerializer, EtapaSerializer,
+    SeguimientoProduccionSerializer, SeguimientoProduccionListSerializer
 )
 
+# Prefetch compartido para serializar órdenes/carritos con sus items anidados
+ITEMS_CON_PRODUCTO_PREFETCH = Prefetch(
+    'items', queryset=ItemOrden.objects.select_related('producto__linea')
+)
+
+def acumular_duracion(seguimiento, now):
+    """Suma al acumulado el tiempo transcurrido desde el último evento.
+
+    Deja la suma como expresión F() para que el incremento se aplique en el
+    propio UPDATE al guardar.
+    """
+    ultima_actividad = seguimiento.actividades.order_by('-timestamp').first()
+    duracion_seg = int((now - ultima_actividad.timestamp).total_seconds())
+    seguimiento.duracion_total_segundos = F('duracion_total_segundos') + duracion_seg
+
+def etag_no_modificado(request, etag):
+    """True si el cliente ya tiene la versión identificada por el ETag."""
+    return request.META.get('HTTP_IF_NONE_MATCH') == etag
+
+# Valores de evento válidos para el cronómetro, precalculados una sola vez
+TIPO_EVENTO_VALUES = frozenset(e.value for e in RegistroActividad.TipoEvento)
+TIPO_EVENTO_LIST = ', '.join(sorted(TIPO_EVENTO_VALUES))
+
+# --- Paginación ---
+# Paginación por cursor sobre columnas únicas e indexadas: evita el COUNT(*)
+# de la paginación por offset y mantiene cada página en O(page_size)
+
+class ProductoCursorPagination(CursorPagination):
+    page_size = 25
+    ordering = 'codigo'
+
+class OrdenCursorPagination(CursorPagination):
+    page_size = 25
+    ordering = '-codigo_orden'
+
 # --- Serializers inline para documentación ---
 class CarritoAddItemSerializer(serializers.Serializer):
     producto_id = serializers.IntegerField(help_text="ID del producto a agregar.")
@@ -29,6 +70,12 @@ class CarritoAddItemSerializer(serializers.Serializer):
 class CarritoUpdateItemSerializer(serializers.Serializer):
     cantidad = serializers.IntegerField(help_text="Nueva cantidad del item. Si es 0, se elimina.")
 
+class AsignarTrabajadoresSerializer(serializers.Serializer):
+    trabajadores_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False,
+        help_text="IDs de los trabajadores a asignar."
+    )
+
 # --- Vistas para Administración (CRUDs básicos) ---
 
 class EmpresaTerceraViewSet(viewsets.ModelViewSet):
@@ -39,7 +86,12 @@ class EmpresaTerceraViewSet(viewsets.ModelViewSet):
 
 class TrabajadorViewSet(viewsets.ModelViewSet):
     """API para gestionar Trabajadores. Permite buscar por nombre, apellido o código."""
-    queryset = Trabajador.objects.all()
+    # Join de empresa_tercera (el serializer expone su nombre) y proyección
+    # limitada a las columnas serializadas
+    queryset = Trabajador.objects.select_related('empresa_tercera').only(
+        'id', 'nombres', 'apellidos', 'codigo', 'tipo',
+        'empresa_tercera__id', 'empresa_tercera__nombre'
+    )
     serializer_class = TrabajadorSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [SearchFilter, DjangoFilterBackend]
@@ -54,13 +106,19 @@ class LineaProductoViewSet(viewsets.ModelViewSet):
 
 class ProductoViewSet(viewsets.ModelViewSet):
     """API para Productos. Permite buscar por nombre o código y filtrar por línea."""
-    queryset = Producto.objects.all().select_related('linea')
+    # only() limita el SELECT a las columnas que el serializer expone
+    queryset = Producto.objects.all().select_related('linea').only(
+        'id', 'nombre', 'codigo', 'presentacion', 'linea__id', 'linea__nombre'
+    )
     serializer_class = ProductoSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [SearchFilter, DjangoFilterBackend, OrderingFilter]
     search_fields = ['nombre', 'codigo']
     filterset_fields = ['linea']
-    ordering_fields = ['nombre', 'codigo']
+    # Solo columnas únicas e inmutables: la paginación por cursor hereda el
+    # ordering del filtro y con 'nombre' podría saltar o repetir filas
+    ordering_fields = ['codigo']
+    pagination_class = ProductoCursorPagination
 
 # --- Vistas para el Flujo de Pedidos y Carrito ---
 
@@ -71,17 +129,66 @@ class CarritoViewSet(viewsets.ViewSet):
     serializer_class = OrdenSerializer
 
     def get_cart(self, user):
-        """Obtiene o crea un carrito para el usuario."""
-        cart, created = Orden.objects.get_or_create(usuario=user, estado=Orden.EstadoOrden.CARRITO)
-        return cart
+        """Obtiene o crea un carrito para el usuario (memoizado por request)."""
+        if not hasattr(self, '_cart'):
+            with transaction.atomic():
+                # El prefetch deja los items con producto y línea listos para el
+                # serializer, que de otro modo consultaría por cada item
+                cart = (
+                    Orden.objects.select_for_update()
+                    .prefetch_related(ITEMS_CON_PRODUCTO_PREFETCH)
+                    .filter(usuario=user, estado=Orden.EstadoOrden.CARRITO)
+                    .first()
+                )
+                if cart is None:
+                    try:
+                        with transaction.atomic():
+                            cart = Orden.objects.create(usuario=user, estado=Orden.EstadoOrden.CARRITO)
+                    except IntegrityError:
+                        # Otra request creó el carrito en paralelo; la
+                        # restricción one_cart_per_user garantiza que es único
+                        cart = (
+                            Orden.objects.prefetch_related(ITEMS_CON_PRODUCTO_PREFETCH)
+                            .get(usuario=user, estado=Orden.EstadoOrden.CARRITO)
+                        )
+            self._cart = cart
+        return self._cart
+
+    def _respuesta_carrito(self, request, cart, status_code=status.HTTP_200_OK):
+        """Respuesta tras mutar el carrito: completa, o mínima con ?minimal=1.
+
+        La versión mínima evita re-serializar todos los items anidados cuando
+        el cliente solo necesita una confirmación.
+        """
+        if request.query_params.get('minimal'):
+            return Response({
+                'id': cart.id,
+                'codigo_orden': cart.codigo_orden,
+                'estado': cart.estado,
+                # Consulta directa: el count() del manager respondería con el
+                # cache de prefetch anterior a la mutación
+                'total_items': ItemOrden.objects.filter(orden=cart).count(),
+            }, status=status_code)
+        # Los items cambiaron en esta request; se repuebla el prefetch para que
+        # el serializer no itere la lista cacheada antes de la mutación
+        cart = Orden.objects.prefetch_related(ITEMS_CON_PRODUCTO_PREFETCH).get(pk=cart.pk)
+        return Response(self.get_serializer(cart).data, status=status_code)
 
     @extend_schema(summary="Ver el carrito actual", responses={200: OrdenSerializer})
     @action(detail=False, methods=['get'], url_path='ver')
     def ver_carrito(self, request):
         """Muestra el contenido del carrito actual."""
         cart = self.get_cart(request.user)
+        # El ETag cambia cuando se agregan, quitan o recuentan items, lo que
+        # permite responder 304 sin serializar el carrito completo
+        agg = cart.items.aggregate(max_id=Max('id'), total=Sum('cantidad'))
+        etag = f'"carrito-{cart.id}-{agg["max_id"]}-{agg["total"]}"'
+        if etag_no_modificado(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
         serializer = self.get_serializer(cart)
-        return Response(serializer.data)
+        response = Response(serializer.data)
+        response['ETag'] = etag
+        return response
 
     @extend_schema(summary="Agregar un item al carrito", request=CarritoAddItemSerializer, responses={201: OrdenSerializer})
     @action(detail=False, methods=['post'], url_path='agregar')
@@ -94,17 +201,18 @@ class CarritoViewSet(viewsets.ViewSet):
             return Response({"error": "ID de producto y cantidad válida son requeridos."}, status=status.HTTP_400_BAD_REQUEST)
 
         cart = self.get_cart(request.user)
-        producto = get_object_or_404(Producto, id=producto_id)
-        
-        item, created = ItemOrden.objects.get_or_create(orden=cart, producto=producto)
-        if not created:
-            item.cantidad += cantidad
-        else:
-            item.cantidad = cantidad
-        item.save()
-        
-        serializer = self.get_serializer(cart)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+        # Incrementa en un solo UPDATE; solo inserta si el item aún no existe.
+        # La FK valida la existencia del producto al insertar, sin SELECT previo.
+        updated = ItemOrden.objects.filter(orden=cart, producto_id=producto_id).update(cantidad=F('cantidad') + cantidad)
+        if not updated:
+            try:
+                with transaction.atomic():
+                    ItemOrden.objects.create(orden=cart, producto_id=producto_id, cantidad=cantidad)
+            except IntegrityError:
+                return Response({"error": "Producto no encontrado."}, status=status.HTTP_404_NOT_FOUND)
+
+        return self._respuesta_carrito(request, cart, status_code=status.HTTP_201_CREATED)
 
     @extend_schema(summary="Actualizar un item del carrito", request=CarritoUpdateItemSerializer, responses={200: OrdenSerializer})
     @action(detail=True, methods=['patch'], url_path='actualizar')
@@ -119,9 +227,8 @@ class CarritoViewSet(viewsets.ViewSet):
             item.save()
         else:
             item.delete()
-            
-        serializer = self.get_serializer(cart)
-        return Response(serializer.data)
+
+        return self._respuesta_carrito(request, cart)
 
     @extend_schema(summary="Eliminar un item del carrito", responses={204: None})
     @action(detail=True, methods=['delete'], url_path='eliminar')
@@ -137,15 +244,18 @@ class CarritoViewSet(viewsets.ViewSet):
     def procesar_pedido(self, request):
         """Convierte el carrito en un pedido procesado y listo para producción."""
         cart = self.get_cart(request.user)
-        if not cart.items.exists():
+        lote = request.data.get('lote', f"LOTE-{cart.codigo_orden}")
+
+        # El filtro por items hace de guardia: un carrito vacío no actualiza
+        # ninguna fila, así el exists() y el UPDATE colapsan en una consulta
+        updated = Orden.objects.filter(pk=cart.pk, items__isnull=False).update(
+            estado=Orden.EstadoOrden.PROCESADA, lote_asignado=lote
+        )
+        if not updated:
             return Response({"error": "El carrito está vacío."}, status=status.HTTP_400_BAD_REQUEST)
-        
-        cart.estado = Orden.EstadoOrden.PROCESADA
-        cart.lote_asignado = request.data.get('lote', f"LOTE-{cart.codigo_orden}")
-        cart.save()
-        
-        serializer = self.get_serializer(cart)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+
+        cart.refresh_from_db(fields=['estado', 'lote_asignado'])
+        return self._respuesta_carrito(request, cart)
     
     # Necesario para que self.get_serializer() funcione en un ViewSet básico
     def get_serializer(self, *args, **kwargs):
@@ -156,78 +266,179 @@ class OrdenViewSet(viewsets.ReadOnlyModelViewSet):
     """API para ver Órdenes procesadas."""
     serializer_class = OrdenSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = OrdenCursorPagination
 
     def get_queryset(self):
         # Evita un error al generar el schema si no hay un usuario autenticado
         if getattr(self, 'swagger_fake_view', False):
             return Orden.objects.none()
         
-        # Excluye los carritos, solo muestra ordenes reales
-        return Orden.objects.filter(usuario=self.request.user).exclude(estado=Orden.EstadoOrden.CARRITO)
+        # Excluye los carritos, solo muestra ordenes reales.
+        # El annotate calcula total_items en una sola consulta agregada,
+        # en lugar de un COUNT por cada orden serializada.
+        return (
+            Orden.objects.filter(usuario=self.request.user)
+            .exclude(estado=Orden.EstadoOrden.CARRITO)
+            .select_related('usuario')
+            .prefetch_related(ITEMS_CON_PRODUCTO_PREFETCH)
+            .annotate(total_items=Count('items'))
+            .only(
+                'id', 'codigo_orden', 'estado', 'fecha_creacion', 'lote_asignado',
+                'usuario__id', 'usuario__username', 'usuario__first_name',
+                'usuario__last_name', 'usuario__email',
+            )
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        orden = self.get_object()
+        # Una orden procesada solo cambia de estado o de lote asignado
+        etag = f'"orden-{orden.pk}-{orden.estado}-{orden.lote_asignado}"'
+        if etag_no_modificado(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+        response = Response(self.get_serializer(orden).data)
+        response['ETag'] = etag
+        return response
 
 # --- Vistas para Flujo de Producción ---
 
 class FlujoProduccionViewSet(viewsets.ReadOnlyModelViewSet):
     """API para ver las Etapas, Procesos y Subprocesos del flujo de producción."""
-    queryset = Etapa.objects.all().prefetch_related('procesos__subprocesos')
+    # Los Prefetch con to_attr dejan listas ya materializadas que el serializer
+    # itera directamente, sin pasar por el manager .all() en cada instancia.
+    queryset = Etapa.objects.all().prefetch_related(
+        Prefetch(
+            'procesos',
+            queryset=Proceso.objects.order_by('orden_secuencia').prefetch_related(
+                Prefetch('subprocesos', queryset=Subproceso.objects.order_by('orden_secuencia'), to_attr='subprocesos_list')
+            ),
+            to_attr='procesos_list',
+        )
+    )
     serializer_class = EtapaSerializer
     permission_classes = [IsAuthenticated]
 
+    def list(self, request, *args, **kwargs):
+        """Devuelve el árbol completo desde cache; se recalcula al cambiar el catálogo."""
+        # La clave versionada del cache sirve también como ETag del árbol
+        etag = f'"{flujo_cache_key()}"'
+        if etag_no_modificado(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+        data = cache.get_or_set(
+            flujo_cache_key(),
+            lambda: self.get_serializer(self.get_queryset(), many=True).data,
+            FLUJO_CACHE_TIMEOUT,
+        )
+        response = Response(data)
+        response['ETag'] = etag
+        return response
+
 class SeguimientoProduccionViewSet(viewsets.ModelViewSet):
     """API para gestionar el seguimiento de la producción de los items de una orden."""
     queryset = SeguimientoProduccion.objects.all()
     serializer_class = SeguimientoProduccionSerializer
     permission_classes = [IsAuthenticated]
-    
-    @extend_schema(summary="Asignar trabajadores a un subproceso")
+
+    def get_serializer_class(self):
+        # El listado usa la versión plana (ids y nombres); el detalle y las
+        # acciones devuelven el serializer anidado completo.
+        if self.action == 'list':
+            return SeguimientoProduccionListSerializer
+        return SeguimientoProduccionSerializer
+
+    def get_queryset(self):
+        # El listado plano solo necesita los nombres de producto y subproceso
+        if self.action == 'list':
+            return SeguimientoProduccion.objects.select_related(
+                'item_orden__producto', 'subproceso_actual'
+            )
+        # El serializer recorre item_orden -> producto -> linea, el subproceso con su
+        # etapa, los trabajadores y las actividades; sin esto cada seguimiento
+        # listado dispara una consulta por relación (1+N).
+        return SeguimientoProduccion.objects.select_related(
+            'item_orden__producto__linea', 'item_orden__orden',
+            'subproceso_actual__proceso__etapa'
+        ).prefetch_related(
+            'trabajadores_asignados__empresa_tercera',
+            Prefetch('actividades', queryset=RegistroActividad.objects.select_related('usuario').order_by('-timestamp')),
+        )
+
+    @extend_schema(summary="Asignar trabajadores a un subproceso", request=AsignarTrabajadoresSerializer)
     @action(detail=True, methods=['post'], url_path='asignar-trabajadores')
+    @transaction.atomic
     def asignar_trabajadores(self, request, pk=None):
         """Asigna uno o más trabajadores a un subproceso."""
-        seguimiento = self.get_object()
-        trabajadores_ids = request.data.get('trabajadores_ids', [])
-        
-        if not isinstance(trabajadores_ids, list):
-            return Response({"error": "Se espera una lista de IDs de trabajadores."}, status=status.HTTP_400_BAD_REQUEST)
-
-        trabajadores = Trabajador.objects.filter(id__in=trabajadores_ids)
-        seguimiento.trabajadores_asignados.set(trabajadores)
-        
-        for trabajador in trabajadores:
-            RegistroAsistencia.objects.update_or_create(
-                seguimiento=seguimiento, trabajador=trabajador, fecha=datetime.now().date(),
-                defaults={'asistio': True}
-            )
-
+        entrada = AsignarTrabajadoresSerializer(data=request.data)
+        entrada.is_valid(raise_exception=True)
+        # Sin duplicados y preservando el orden: un id repetido haría que el
+        # INSERT ... ON CONFLICT DO UPDATE toque la misma fila dos veces, lo
+        # que PostgreSQL rechaza
+        trabajadores_ids = list(dict.fromkeys(entrada.validated_data['trabajadores_ids']))
+
+        # Bloquea la fila para que la asignación M2M y las asistencias se
+        # escriban en una sola transacción, sin intercalarse con otra request
+        seguimiento = get_object_or_404(SeguimientoProduccion.objects.select_for_update(), pk=pk)
+
+        # Un solo SELECT indexado valida la existencia de todos los IDs. No se
+        # puede delegar en las FKs: Django las crea DEFERRABLE INITIALLY
+        # DEFERRED, así que un id inexistente recién fallaría en el COMMIT de
+        # la transacción externa, fuera de cualquier try/except de la vista.
+        ids_existentes = set(Trabajador.objects.filter(id__in=trabajadores_ids).values_list('id', flat=True))
+        if ids_existentes != set(trabajadores_ids):
+            return Response({"error": "Uno o más IDs de trabajadores no existen."}, status=status.HTTP_400_BAD_REQUEST)
+
+        seguimiento.trabajadores_asignados.set(trabajadores_ids)
+
+        # Un solo INSERT ... ON CONFLICT en lugar de un update_or_create por trabajador
+        hoy = timezone.now().date()
+        registros = [
+            RegistroAsistencia(seguimiento=seguimiento, trabajador_id=trabajador_id, fecha=hoy, asistio=True)
+            for trabajador_id in trabajadores_ids
+        ]
+        RegistroAsistencia.objects.bulk_create(
+            registros,
+            update_conflicts=True,
+            unique_fields=['seguimiento', 'trabajador', 'fecha'],
+            update_fields=['asistio'],
+        )
+
+        # Recarga desde el queryset prefetcheado para que la respuesta anidada
+        # no dispare cargas perezosas por relación
+        seguimiento = self.get_queryset().get(pk=seguimiento.pk)
         return Response(self.get_serializer(seguimiento).data)
 
     @extend_schema(summary="Controlar el cronómetro de un subproceso")
     @action(detail=True, methods=['post'], url_path='control-tiempo')
+    @transaction.atomic
     def controlar_tiempo(self, request, pk=None):
         """Controla el cronómetro: INICIO, PAUSA, REANUDAR, FIN."""
-        seguimiento = self.get_object()
+        # El lock serializa eventos concurrentes sobre el mismo seguimiento:
+        # dos PAUSA simultáneas ya no pueden duplicar la duración acumulada
+        seguimiento = get_object_or_404(SeguimientoProduccion.objects.select_for_update(), pk=pk)
         evento = request.data.get('evento', '').upper()
         
         if not seguimiento.trabajadores_asignados.exists():
             return Response({"error": "No hay trabajadores asignados a este subproceso."}, status=status.HTTP_400_BAD_REQUEST)
 
-        if evento not in [e.value for e in RegistroActividad.TipoEvento]:
-            return Response({"error": f"Evento no válido. Use: {', '.join([e.value for e in RegistroActividad.TipoEvento])}"}, status=status.HTTP_400_BAD_REQUEST)
+        if evento not in TIPO_EVENTO_VALUES:
+            return Response({"error": f"Evento no válido. Use: {TIPO_EVENTO_LIST}"}, status=status.HTTP_400_BAD_REQUEST)
         
-        now = datetime.now(timezone.utc)
-        ultima_actividad = seguimiento.actividades.order_by('-timestamp').first()
+        now = timezone.now()
+        update_fields = ['estado']
 
         if evento == 'INICIO':
             if seguimiento.estado != 'PENDIENTE':
                 return Response({"error": "El trabajo ya ha sido iniciado."}, status=status.HTTP_400_BAD_REQUEST)
             seguimiento.estado = 'EN_PROGRESO'
             seguimiento.fecha_inicio = now
+            update_fields.append('fecha_inicio')
 
         elif evento == 'PAUSA':
             if seguimiento.estado != 'EN_PROGRESO':
                 return Response({"error": "El trabajo no está en progreso."}, status=status.HTTP_400_BAD_REQUEST)
-            duracion = (now - ultima_actividad.timestamp).total_seconds()
-            seguimiento.duracion_total_segundos += int(duracion)
+            # Solo PAUSA y FIN necesitan el último evento para calcular la duración
+            acumular_duracion(seguimiento, now)
             seguimiento.estado = 'PAUSADO'
+            update_fields.append('duracion_total_segundos')
 
         elif evento == 'REANUDAR':
             if seguimiento.estado != 'PAUSADO':
@@ -238,12 +449,16 @@ class SeguimientoProduccionViewSet(viewsets.ModelViewSet):
             if seguimiento.estado not in ['EN_PROGRESO', 'PAUSADO']:
                 return Response({"error": "El trabajo no puede ser finalizado en su estado actual."}, status=status.HTTP_400_BAD_REQUEST)
             if seguimiento.estado == 'EN_PROGRESO':
-                duracion = (now - ultima_actividad.timestamp).total_seconds()
-                seguimiento.duracion_total_segundos += int(duracion)
+                acumular_duracion(seguimiento, now)
+                update_fields.append('duracion_total_segundos')
             seguimiento.estado = 'FINALIZADO'
             seguimiento.fecha_fin = now
-        
+            update_fields.append('fecha_fin')
+
         RegistroActividad.objects.create(seguimiento=seguimiento, tipo_evento=evento, usuario=request.user)
-        seguimiento.save()
-        
+        seguimiento.save(update_fields=update_fields)
+
+        # Recarga desde el queryset prefetcheado: resuelve el valor final del
+        # F() y evita cargas perezosas al serializar la respuesta anidada
+        seguimiento = self.get_queryset().get(pk=seguimiento.pk)
         return Response(self.get_serializer(seguimiento).data)
\ No newline at end of file
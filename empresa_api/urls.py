@@ -1,5 +1,7 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
+from django.views.decorators.cache import cache_page
 
 # --- Importaciones para drf-spectacular ---
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
@@ -10,6 +12,12 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 
+# Generar el schema introspecciona todos los viewsets y serializers en cada
+# request; fuera de desarrollo se cachea la respuesta por una hora.
+schema_view = SpectacularAPIView.as_view()
+if not settings.DEBUG:
+    schema_view = cache_page(60 * 60)(schema_view)
+
 urlpatterns = [
     path('admin/', admin.site.urls),
 
@@ -25,7 +33,7 @@ urlpatterns = [
     path('api/v1/auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     # --- RUTAS PARA LA DOCUMENTACIÓN (SWAGGER / OPENAPI) ---
     # Genera el archivo schema.yaml
-    path('api/v1/schema/', SpectacularAPIView.as_view(), name='schema'),
+    path('api/v1/schema/', schema_view, name='schema'),
     # Interfaz de Swagger UI (la más común)
     path('api/v1/schema/swagger-ui/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
     # Interfaz de ReDoc (alternativa)